@@ -0,0 +1,145 @@
+# cython: language_level=3
+#
+# Optional compiled fast path for Bimap. Build in place with
+#
+#	cythonize -i _bimap.pyx
+#
+# and bimap.py will pick it up automatically; without it the pure
+# Python class is used. The compiled class replaces the base of the
+# whole hierarchy -- IntBimap, FrozenBimap and TwoTierBimap derive from
+# it -- so item2ord and the cached lookup are exposed read-only and
+# _hash read-write for the subclasses (and the self-test). The two
+# implementations must stay in sync, see bimap.py for the documented
+# semantics.
+
+import sys
+
+# the FrozenBimap subclass, injected by bimap.py once it is defined;
+# resolving it with an import here would pick the wrong class when
+# bimap.py runs as __main__
+FrozenBimap = None
+
+cdef class Bimap:
+	cdef readonly dict item2ord
+	cdef readonly object _lookup
+	cdef public object _hash
+	cdef object _keys_cache
+
+	def __init__(self, *args):
+		self.item2ord = {}
+		self._lookup = self.item2ord.get
+		self._hash = None
+		self._keys_cache = None
+
+		if args:
+			self.register_many(args)
+
+	def _internal(self):
+		return type(self).__name__, self.item2ord
+
+	def __bool__(self):
+		return bool(self.item2ord)
+
+	def __eq__(self, other):
+		if self is other:
+			return True
+		# against the base class, so sibling subclasses compare
+		# compatibly (a freeze() snapshot equals its source)
+		if isinstance(other, Bimap):
+			# through the public protocol, so subclasses with their own
+			# notion of length/iteration (TwoTierBimap) compare correctly
+			if len(self) != len(other):
+				return False
+			return list(self) == list(other)
+		return NotImplemented
+
+	def __ne__(self, other):
+		result = self.__eq__(other)
+		if result is NotImplemented:
+			return result
+		return not result
+
+	def __hash__(self):
+		h = self._hash
+		if h is None:
+			h = hash(tuple(self.item2ord))
+			self._hash = h
+		return h
+
+	def __repr__(self):
+		args = ', '.join(map(repr, self))
+		return f'{type(self).__name__}({args})'
+
+	def __len__(self):
+		return len(self.item2ord)
+
+	def __iter__(self):
+		return iter(self.item2ord)
+
+	def __getitem__(self, item):
+		return self.item2ord.get(item)
+
+	def register(self, item):
+		if item is None:
+			raise ValueError(f'{type(self).__name__} cannot register "None"')
+		if type(item) is str:
+			item = sys.intern(item)
+		ordinal = self.item2ord.get(item)
+		if ordinal is None:
+			ordinal = len(self.item2ord)
+			self.item2ord[item] = ordinal
+			self._hash = None
+			self._keys_cache = None
+		return ordinal
+
+	def register_many(self, iterable):
+		cdef list ordinals = []
+		for item in iterable:
+			if item is None:
+				raise ValueError(f'{type(self).__name__} cannot register "None"')
+			if type(item) is str:
+				item = sys.intern(item)
+			ordinal = self.item2ord.get(item)
+			if ordinal is None:
+				ordinal = len(self.item2ord)
+				self.item2ord[item] = ordinal
+				self._hash = None
+				self._keys_cache = None
+			ordinals.append(ordinal)
+		return ordinals
+
+	def freeze(self):
+		frozen = FrozenBimap.__new__(FrozenBimap)
+		cdef Bimap base = <Bimap>frozen
+		base.item2ord = { item: ordinal for ordinal, item in self.enumerate() }
+		base._lookup = base.item2ord.get
+		base._hash = self._hash
+		frozen._seal()
+		return frozen
+
+	def ordinal(self, item):
+		return self[item]
+
+	def item(self, ordinal):
+		if 0 <= ordinal < len(self.item2ord):
+			keys = self._keys_cache
+			if keys is None:
+				keys = tuple(self.item2ord)
+				self._keys_cache = keys
+			return keys[ordinal]
+		return None
+
+	def nth(self, ordinal): # alias for .item()
+		return self.item(ordinal)
+
+	def ordinals(self):
+		return range(len(self.item2ord))
+
+	def enumerate(self):
+		return enumerate(self.item2ord)
+
+	def range(self):
+		return set(self)
+
+	def domain(self):
+		return range(len(self))
@@ -1,4 +1,5 @@
-from collections import OrderedDict
+import sys
+from array import array
 
 """
 	Bimap provides a method to bijectively map between distinct immutable items
@@ -36,7 +37,7 @@ from collections import OrderedDict
 
 
 	Bimap supports the following protocols, mostly by delegation to the underlying
-	OrderedDict.
+	dict.
 
 		bool()
 			False if empty, True otherwise.
@@ -49,6 +50,11 @@ from collections import OrderedDict
 
 		comparison (__eq__ and __ne__)
 
+		hash()
+			Equal Bimaps hash equal, so a Bimap can be used as a dict key or
+			set member. The hash reflects the current item sequence and is
+			cached between registrations.
+
 		len()
 
 		iter()
@@ -67,23 +73,33 @@ from collections import OrderedDict
 		register(item) -> ordinal
 			Add an item to the Bimap.
 
+		register_many(iterable) -> ordinals
+			Add every item from an iterable to the Bimap, returning the list of
+			their ordinals. Cheaper than calling register() in a loop.
+
+		freeze() -> FrozenBimap
+			Returns an immutable snapshot of the mapping as a FrozenBimap,
+			without re-registering the items and sharing no mutable state with
+			the original. Freezing a FrozenBimap returns the same instance.
+
 		ordinal(item) -> ordinal
 			Gives the ordinal of a registered item, or None. Note: this function does not
 			register a previously unregistered item.
 
 		item(n) -> item
 		nth(n) -> item
-			Gives the n:th registered item.
+			Gives the n:th registered item. Amortized O(1): the key sequence
+			is snapshotted into a tuple on first use and the snapshot is
+			invalidated by registration.
 
 		ordinals()
-			Returns the underlying OrderedDict. Can be used to iterate over the ordinals:
+			Returns a range() of the ordinals. Can be used to iterate over the ordinals:
 
 				for i in bm.ordinals():
 					pass
 
 		enumerate()
 			Enumerate the items by ordinal. Useful for iteration over all (item, ordinal) pairs.
-			This is simply a delegation to the underlying OrderedDict's .items()
 
 				for ordinal, item in bm.enumerate():
 					pass
@@ -97,24 +113,49 @@ from collections import OrderedDict
 
 __license__ = "poetic"
 
+# format strings like "Bimap({!r}, {!r})", generated on first use and
+# cached per (class, arity) for the small-repr fast path; module level
+# so it works for every class in the hierarchy, also when the compiled
+# fast path rebinds the Bimap name
+_repr_formats = {}
+
 class Bimap():
-	def __init__(self, *args):
-		self._classname = type(self).__name__
-		self.item2ord = OrderedDict()
-		self.ord2item = OrderedDict()
+	__slots__ = ( 'item2ord', '_lookup', '_hash', '_keys_cache' )
 
-		for item in args:
-			self.register(item)
+	def __init__(self, *args):
+		self.item2ord = {}
+		self._hash = None
+		self._keys_cache = None
+		# item2ord is mutated but never rebound, so a bound method
+		# cached here stays valid and saves two attribute loads per
+		# lookup on the hottest path; .get returns None on a miss,
+		# which is exactly the __getitem__ contract (None is never
+		# a registered item)
+		self._lookup = self.item2ord.get
+
+		if args:
+			self.register_many(args)
 
 	def _internal(self):
-		return self._classname, self.item2ord, self.ord2item
+		return type(self).__name__, self.item2ord
 
 	def __bool__(self):
 		return bool(self.item2ord)
 
 	def __eq__(self, other):
-		if isinstance(other, self.__class__):
-			return self.item2ord == other.item2ord
+		if self is other:
+			return True
+		# against the base class, not self.__class__: sibling
+		# subclasses must compare compatibly, e.g. a freeze() snapshot
+		# equals its TwoTierBimap/IntBimap source
+		if isinstance(other, Bimap):
+			# compare through the public protocol rather than item2ord,
+			# so subclasses with their own notion of length/iteration
+			# (TwoTierBimap) are handled correctly; equal item sequences
+			# imply equal ordinals as well
+			if len(self) != len(other):
+				return False
+			return list(self) == list(other)
 		return NotImplemented
 
 	def __ne__(self, other):
@@ -123,9 +164,31 @@ class Bimap():
 			return result
 		return not result
 
+	def __hash__(self):
+		# Idempotency means a registered item never moves, but new
+		# registrations do change the hash -- just like they change
+		# equality. The tuple hash is cached until the next mutation,
+		# so repeated dict/set use of the same Bimap is cheap.
+		h = self._hash
+		if h is None:
+			h = hash(tuple(self.item2ord))
+			self._hash = h
+		return h
+
 	def __repr__(self):
-		args = ', '.join([ repr(x) for x in self ])
-		return '{}({})'.format(self._classname, args)
+		name = type(self).__name__
+		n = len(self.item2ord)
+		if n <= 8:
+			# small Bimaps repr through a pregenerated template, one
+			# str.format call instead of a repr/join pipeline
+			key = (name, n)
+			fmt = _repr_formats.get(key)
+			if fmt is None:
+				fmt = f'{name}({", ".join([ "{!r}" ] * n)})'
+				_repr_formats[key] = fmt
+			return fmt.format(*self.item2ord)
+		args = ', '.join(map(repr, self))
+		return f'{name}({args})'
 
 	def __len__(self):
 		return len(self.item2ord)
@@ -134,36 +197,82 @@ class Bimap():
 		return iter(self.item2ord)
 
 	def __getitem__(self, item):
-		try:
-			return self.item2ord[item]
-		except KeyError:
-			return None
+		return self._lookup(item)
 
 	def register(self, item):
 		if item is None:
-			raise ValueError(self._classname + ' cannot register "None"')
-		try:
-			return self.item2ord[item]
-		except KeyError:
-			ordinal = len(self)
+			raise ValueError(f'{type(self).__name__} cannot register "None"')
+		if type(item) is str:
+			# interned strings compare by pointer in dict lookups,
+			# which is the common case for a string interner client
+			item = sys.intern(item)
+		# a sentinel probe instead of try/KeyError: hits (the hot case
+		# for an interner) pay a single lookup and nothing else, only
+		# misses probe again for the insert
+		ordinal = self._lookup(item)
+		if ordinal is None:
+			ordinal = len(self.item2ord)
 			self.item2ord[item] = ordinal
-			self.ord2item[ordinal] = item
-			return ordinal
+			self._hash = None
+			self._keys_cache = None
+		return ordinal
+
+	def register_many(self, iterable):
+		# batch variant of register(): binds the containers and their
+		# hot methods to locals once, amortizing the per-call overhead
+		# (method dispatch, attribute loads) over the whole batch
+		item2ord = self.item2ord
+		lookup = item2ord.get
+		intern = sys.intern
+		ordinals = []
+		collect = ordinals.append
+		for item in iterable:
+			if item is None:
+				raise ValueError(f'{type(self).__name__} cannot register "None"')
+			if type(item) is str:
+				item = intern(item)
+			ordinal = lookup(item)
+			if ordinal is None:
+				ordinal = len(item2ord)
+				item2ord[item] = ordinal
+				self._hash = None
+				self._keys_cache = None
+			collect(ordinal)
+		return ordinals
+
+	def freeze(self):
+		# the items are already validated and interned, so snapshot
+		# them instead of re-registering; through the public
+		# enumeration, so tiered subclasses flatten correctly
+		frozen = FrozenBimap.__new__(FrozenBimap)
+		frozen.item2ord = { item: ordinal for ordinal, item in self.enumerate() }
+		frozen._lookup = frozen.item2ord.get
+		frozen._hash = self._hash
+		frozen._keys_cache = None
+		frozen._seal()
+		return frozen
 
 	def ordinal(self, item):
 		return self[item]
 
 	def item(self, ordinal):
-		try:
-			return self.ord2item[ordinal]
-		except KeyError:
-			return None
+		# the dict's insertion order _is_ the ordinal order, so the
+		# n:th key is the n:th item; the key sequence is snapshotted
+		# on first use and invalidated by registration, keeping this
+		# amortized O(1)
+		if 0 <= ordinal < len(self.item2ord):
+			keys = self._keys_cache
+			if keys is None:
+				keys = tuple(self.item2ord)
+				self._keys_cache = keys
+			return keys[ordinal]
+		return None
 
 	def nth(self, ordinal): # alias for .item()
 		return self.item(ordinal)
 
 	def ordinals(self):
-		return self.ord2item.keys()
+		return range(len(self.item2ord))
 
 	def enumerate(self):
 		return enumerate(self.item2ord)
@@ -174,6 +283,207 @@ class Bimap():
 	def domain(self):
 		return range(len(self))
 
+try:
+	# compiled fast path, built in place with ''cythonize -i _bimap.pyx''.
+	# Imported before the subclasses are defined, so either the whole
+	# hierarchy sits on the compiled base or none of it does.
+	from _bimap import Bimap
+except ImportError:
+	pass
+
+class IntBimap(Bimap):
+	"""
+		A Bimap restricted to (signed 64-bit) int items. The ordinal -> item
+		table is kept in a compact array('q'), giving O(1) item() lookup,
+		and as_array() exposes it without copying, so numeric code (numpy,
+		numba, ...) can consume it directly through the buffer protocol.
+	"""
+
+	__slots__ = ( 'ord2item', )
+
+	def __init__(self, *args):
+		super().__init__()
+		self.ord2item = array('q')
+		if args:
+			self.register_many(args)
+
+	def _internal(self):
+		return type(self).__name__, self.item2ord, self.ord2item
+
+	def register(self, item):
+		# bool is deliberately rejected along with everything else
+		# that is not exactly int
+		if type(item) is not int:
+			raise TypeError(f'{type(self).__name__} items must be int, not {type(item).__name__}')
+		# reject out-of-range ints before touching item2ord; letting
+		# array('q').append raise afterwards would leave the two
+		# tables permanently out of step
+		if not -2 ** 63 <= item < 2 ** 63:
+			raise OverflowError(f'{type(self).__name__} items must fit in a signed 64-bit int')
+		next_ordinal = len(self.item2ord)
+		ordinal = super().register(item)
+		if ordinal == next_ordinal:
+			self.ord2item.append(item)
+		return ordinal
+
+	def register_many(self, iterable):
+		return [ self.register(item) for item in iterable ]
+
+	def item(self, ordinal):
+		# O(1), unlike the base class: the array is indexed by ordinal
+		if 0 <= ordinal < len(self.ord2item):
+			return self.ord2item[ordinal]
+		return None
+
+	def as_array(self):
+		return self.ord2item
+
+class FrozenBimap(Bimap):
+	"""
+		An immutable Bimap. The ordinal -> item table is snapshotted into a
+		tuple at construction and register()/register_many() raise TypeError,
+		so the cached hash can never go stale and instances are safe to share
+		freely (between threads, as long-lived dict keys, ...).
+	"""
+
+	__slots__ = ( 'ord2item', )
+
+	def __init__(self, *args):
+		super().__init__()
+		if args:
+			super().register_many(args)
+		self._seal()
+
+	def _seal(self):
+		self.ord2item = tuple(self.item2ord)
+
+	def _internal(self):
+		return type(self).__name__, self.item2ord, self.ord2item
+
+	def register(self, item):
+		raise TypeError(f'{type(self).__name__} does not support registration')
+
+	def register_many(self, iterable):
+		raise TypeError(f'{type(self).__name__} does not support registration')
+
+	def freeze(self): # already immutable
+		return self
+
+	def item(self, ordinal):
+		# O(1), unlike the base class: the tuple is indexed by ordinal
+		if 0 <= ordinal < len(self.ord2item):
+			return self.ord2item[ordinal]
+		return None
+
+try:
+	# the compiled base's freeze() needs this module's FrozenBimap
+	import _bimap
+except ImportError:
+	pass
+else:
+	_bimap.FrozenBimap = FrozenBimap
+
+class TwoTierBimap(Bimap):
+	"""
+		A Bimap with a fixed, pre-registered static tier in front of the
+		dynamic tier. Static items occupy the ordinals 0..K-1 and are looked
+		up in a dict that can be shared between instances; only dynamically
+		registered items allocate per-instance storage. The typical client is
+		an interner where the common items (keywords, operators, ...) are
+		known up front.
+
+		Pass either an iterable of static items, or an existing TwoTierBimap
+		whose static tier is then borrowed rather than rebuilt:
+
+			proto = TwoTierBimap(KEYWORDS)
+			scope = TwoTierBimap(proto, 'x', 'y')
+	"""
+
+	__slots__ = ( 'static_items', 'static2ord' )
+
+	def __init__(self, static, *args):
+		if isinstance(static, TwoTierBimap):
+			self.static_items = static.static_items
+			self.static2ord = static.static2ord
+		else:
+			# the static tier honours the same invariants register()
+			# enforces on the dynamic tier: no None, str interned,
+			# duplicates collapse
+			static_items = []
+			static2ord = {}
+			for item in static:
+				if item is None:
+					raise ValueError(f'{type(self).__name__} cannot register "None"')
+				if type(item) is str:
+					item = sys.intern(item)
+				if static2ord.setdefault(item, len(static_items)) == len(static_items):
+					static_items.append(item)
+			self.static_items = tuple(static_items)
+			self.static2ord = static2ord
+		super().__init__(*args)
+
+	def _internal(self):
+		return type(self).__name__, self.static_items, self.item2ord
+
+	def __bool__(self):
+		return bool(self.static_items) or bool(self.item2ord)
+
+	def __hash__(self):
+		# like Bimap.__hash__, but over both tiers to stay consistent
+		# with __eq__
+		h = self._hash
+		if h is None:
+			h = hash(tuple(self))
+			self._hash = h
+		return h
+
+	def __repr__(self):
+		args = ', '.join(map(repr, self.item2ord))
+		if args:
+			return f'{type(self).__name__}({self.static_items!r}, {args})'
+		return f'{type(self).__name__}({self.static_items!r})'
+
+	def __len__(self):
+		return len(self.static_items) + len(self.item2ord)
+
+	def __iter__(self):
+		yield from self.static_items
+		yield from self.item2ord
+
+	def __getitem__(self, item):
+		ordinal = self.static2ord.get(item)
+		if ordinal is not None:
+			return ordinal
+		ordinal = self._lookup(item)
+		if ordinal is not None:
+			ordinal += len(self.static_items)
+		return ordinal
+
+	def register(self, item):
+		if item is None:
+			raise ValueError(f'{type(self).__name__} cannot register "None"')
+		if type(item) is str:
+			item = sys.intern(item)
+		ordinal = self.static2ord.get(item)
+		if ordinal is not None:
+			return ordinal
+		return super().register(item) + len(self.static_items)
+
+	def register_many(self, iterable):
+		return [ self.register(item) for item in iterable ]
+
+	def item(self, ordinal):
+		static_items = self.static_items
+		if 0 <= ordinal < len(static_items):
+			return static_items[ordinal]
+		return super().item(ordinal - len(static_items))
+
+	def ordinals(self):
+		return range(len(self))
+
+	def enumerate(self):
+		return enumerate(self)
+
 if __name__ == '__main__':
 	bm = Bimap()
 
@@ -234,7 +544,7 @@ if __name__ == '__main__':
 	# Test _internal()
 
 	try:
-		assert repr(bm._internal()) == "('Bimap', OrderedDict([('xyzzy', 0), ('plugh', 1), ('foo', 2), ('bar', 3), ('ack!', 4)]), OrderedDict([(0, 'xyzzy'), (1, 'plugh'), (2, 'foo'), (3, 'bar'), (4, 'ack!')]))"
+		assert repr(bm._internal()) == "('Bimap', {'xyzzy': 0, 'plugh': 1, 'foo': 2, 'bar': 3, 'ack!': 4})"
 	except AssertionError:
 		print(repr(bm._internal()))
 		raise
@@ -247,6 +557,13 @@ if __name__ == '__main__':
 	assert bm.register('ack!')  == 4
 	assert bm.register('plugh') == 1
 
+	# Test .register_many()
+
+	bm3 = Bimap()
+
+	assert bm3.register_many(test_items + [ 'plugh' ]) == [ 0, 1, 2, 3, 4, 1 ]
+	assert bm3 == bm
+
 	# Test .nth()
 
 	assert bm.item(2) == 'foo'
@@ -297,6 +614,154 @@ if __name__ == '__main__':
 
 	assert list(bm.enumerate()) == [ (0, 'xyzzy'), (1, 'plugh'), (2, 'foo'), (3, 'bar'), (4, 'ack!') ]
 
+	# Test hash(): equal Bimaps hash equal, registration invalidates
+	# the cached hash
+
+	assert hash(bm3) == hash(bm)
+
+	d = { bm3: 'mapped' }
+
+	assert d[Bimap(*test_items)] == 'mapped'
+
+	old_hash = hash(bm3)
+	bm3.register('quux')
+
+	assert bm3._hash == None
+	assert hash(bm3) != old_hash
+
+	# Test IntBimap
+
+	ib = IntBimap(42, 17, 42, 1000)
+
+	assert ib[42] == 0 and ib[17] == 1 and ib[1000] == 2
+	assert ib.item(1) == 17
+	assert ib.register(17) == 1
+	assert ib.as_array().typecode == 'q'
+	assert list(ib.as_array()) == [ 42, 17, 1000 ]
+	assert ib == eval(repr(ib))
+
+	# Verify that IntBimap rejects non-int items (including bool)
+
+	for bad_item in '17', 17.0, True:
+		try:
+			ib.register(bad_item)
+		except TypeError:
+			pass
+		else:
+			raise AssertionError('IntBimap should only accept int items')
+
+	# Verify that out-of-range ints are rejected without corrupting
+	# the mapping
+
+	for bad_item in 2 ** 63, -2 ** 63 - 1:
+		try:
+			ib.register(bad_item)
+		except OverflowError:
+			pass
+		else:
+			raise AssertionError('IntBimap should only accept 64-bit items')
+		assert bad_item not in ib.item2ord
+
+	assert len(ib) == 3
+	assert ib.register(5) == 3 and ib.item(3) == 5 and ib[5] == 3
+	assert ib.freeze() == ib
+
+	# Test FrozenBimap
+
+	fbm = FrozenBimap(*test_items)
+
+	assert list(fbm) == test_items
+	assert fbm['plugh'] == 1 and fbm.item(2) == 'foo'
+	assert fbm == eval(repr(fbm))
+	assert hash(fbm) == hash(Bimap(*test_items))
+	assert type(fbm.ord2item) is tuple
+
+	# Verify that FrozenBimap rejects registration
+
+	try:
+		fbm.register('quux')
+	except TypeError:
+		pass
+	else:
+		raise AssertionError('FrozenBimap should not accept register()')
+
+	try:
+		fbm.register_many([ 'quux' ])
+	except TypeError:
+		pass
+	else:
+		raise AssertionError('FrozenBimap should not accept register_many()')
+
+	# Test .freeze(): a snapshot sharing no mutable state
+
+	src = Bimap(*test_items)
+	frozen = src.freeze()
+
+	assert type(frozen) is FrozenBimap
+	assert frozen == fbm
+	assert frozen.freeze() is frozen
+
+	src.register('quux')
+
+	assert len(frozen) == 5 and frozen['quux'] == None
+
+	# Test TwoTierBimap: static items get the low ordinals, dynamic
+	# registrations continue after them
+
+	tt = TwoTierBimap(( 'if', 'else', 'while' ), 'foo', 'if', 'bar')
+
+	assert len(tt) == 5
+	assert tt['if'] == 0 and tt['while'] == 2
+	assert tt['foo'] == 3 and tt['bar'] == 4
+	assert tt['wat!'] == None
+	assert tt.register('else') == 1
+	assert tt.register('baz') == 5
+	assert tt.item(1) == 'else' and tt.item(4) == 'bar' and tt.item(6) == None
+	assert list(tt) == [ 'if', 'else', 'while', 'foo', 'bar', 'baz' ]
+	assert list(tt.enumerate()) == [ (i, item) for i, item in enumerate(tt) ]
+	assert tt == eval(repr(tt))
+
+	# Verify that the static tier enforces the register() invariants:
+	# None is rejected, duplicates collapse
+
+	try:
+		TwoTierBimap(( 'k', None ))
+	except ValueError:
+		pass
+	else:
+		raise AssertionError('TwoTierBimap should not accept a None static item')
+
+	tt3 = TwoTierBimap(( 'k', 'k' ), 'x')
+
+	assert len(tt3) == 2
+	assert tt3['k'] == 0 and tt3['x'] == 1
+	assert list(tt3) == [ 'k', 'x' ]
+	assert tt3.item(0) == 'k' and tt3.item(1) == 'x'
+
+	# Test cross-class comparison: tier boundaries do not matter for
+	# equality, only the item sequence (and thereby the ordinals) does
+
+	assert Bimap('x') != TwoTierBimap(( 'k', ), 'x')
+	assert TwoTierBimap(( 'k', ), 'x') != Bimap('x')
+	assert Bimap('k', 'x') == TwoTierBimap(( 'k', ), 'x')
+	assert hash(Bimap('k', 'x')) == hash(TwoTierBimap(( 'k', ), 'x'))
+
+	# Test static tier sharing
+
+	tt2 = TwoTierBimap(tt, 'foo', 'bar', 'baz')
+
+	assert tt2.static2ord is tt.static2ord
+	assert tt2 == tt
+
+	# Test freezing a TwoTierBimap: the tiers flatten, ordinals are kept
+
+	tt_frozen = tt.freeze()
+
+	assert type(tt_frozen) is FrozenBimap
+	assert tt_frozen == FrozenBimap(*tt)
+	assert tt_frozen == tt
+	assert tt_frozen['baz'] == 5 and tt_frozen.item(0) == 'if'
+
 	# Test somewhat involved eval(repr)-roundtrip
 
 	bm.register(( 1, 2 ))